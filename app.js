@@ -75,17 +75,17 @@ function renderHistory(rows) {
     .join('');
 }
 
-function computeYAxisLock(points, model) {
-  const closes = points.map((p) => p.close);
-
-  const floorBand = points.map(() => model.floor);
-  const range68LowBand = points.map(() => model.range68.low);
-  const range68HighBand = points.map(() => model.range68.high);
-  const range95LowBand = points.map(() => model.range95.low);
-  const range95HighBand = points.map(() => model.range95.high);
+function computeYAxisLock(series, model) {
+  const closes = series.close;
 
   const all = []
-    .concat(closes, floorBand, range68LowBand, range68HighBand, range95LowBand, range95HighBand)
+    .concat(closes, [
+      model.floor,
+      model.range68.low,
+      model.range68.high,
+      model.range95.low,
+      model.range95.high,
+    ])
     .filter((v) => typeof v === 'number' && Number.isFinite(v));
 
   if (!all.length) return null;
@@ -99,21 +99,21 @@ function computeYAxisLock(points, model) {
   return { min: min - pad, max: max + pad };
 }
 
-function renderChart(points, model) {
-  const labels = points.map((p) =>
-    new Date(p.ts).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
+function renderChart(series, model) {
+  const labels = series.ts.map((ts) =>
+    new Date(ts).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
   );
-  const closes = points.map((p) => p.close);
+  const closes = series.close;
 
-  const floorBand = points.map(() => model.floor);
-  const range68LowBand = points.map(() => model.range68.low);
-  const range68HighBand = points.map(() => model.range68.high);
-  const range95LowBand = points.map(() => model.range95.low);
-  const range95HighBand = points.map(() => model.range95.high);
+  const floorBand = closes.map(() => model.floor);
+  const range68LowBand = closes.map(() => model.range68.low);
+  const range68HighBand = closes.map(() => model.range68.high);
+  const range95LowBand = closes.map(() => model.range95.low);
+  const range95HighBand = closes.map(() => model.range95.high);
 
   // Ensure we have a lock (should already be set in loadAndRender, but safe fallback)
   if (!yAxisLock) {
-    yAxisLock = computeYAxisLock(points, model);
+    yAxisLock = computeYAxisLock(series, model);
     if (yAxisLock && lastParamsKey) yAxisLockByKey[lastParamsKey] = yAxisLock;
   }
 
@@ -1,103 +1,176 @@
 #!/usr/bin/env python3
-import json
+import functools
+import gzip
 import math
+import queue
+import socket
 import sqlite3
-import statistics
+import threading
+import time
 import urllib.parse
-import urllib.request
 from datetime import datetime, timezone
 from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import numpy as np
+import orjson
+import urllib3
+from scipy.signal import lfilter
+
 HOST = "0.0.0.0"
 PORT = 8080
 DB_FILE = Path("predictions.db")
 
-def fetch_ohlc(days: int):
+# Daily candles only change on the current (unfinished) bar, so responses are
+# safe to reuse for a short while instead of hitting Binance per request.
+OHLC_CACHE_TTL = 60.0
+
+# Candles live in one structure-of-arrays block: each field is a contiguous
+# column the numeric kernel can view without rebuilding per-bar dicts.
+OHLC_DTYPE = np.dtype(
+    [("ts", "i8"), ("open", "f8"), ("high", "f8"), ("low", "f8"), ("close", "f8")]
+)
+_ohlc_cache = {}
+_ohlc_inflight = {}
+_ohlc_cache_lock = threading.Lock()
+
+
+# Pooled client so cache misses reuse one kept-alive TLS connection to
+# Binance instead of paying a fresh handshake per fetch.
+_http = urllib3.PoolManager(
+    num_pools=1,
+    maxsize=8,
+    headers={"User-Agent": "btc-floor-app/1.0"},
+    timeout=urllib3.Timeout(total=20),
+)
+
+
+def _fetch_ohlc_remote(days: int):
     url = (
         "https://api.binance.com/api/v3/klines"
         f"?symbol=BTCUSDT&interval=1d&limit={days}"
     )
-    req = urllib.request.Request(url, headers={"User-Agent": "btc-floor-app/1.0"})
-    with urllib.request.urlopen(req, timeout=20) as res:
-        data = json.loads(res.read().decode("utf-8"))
-        if isinstance(data, dict) and "code" in data:
-            raise ValueError(f"Binance API error: {data.get('msg')}")
-
-    points = []
-    for row in data:
-        points.append(
-            {
-                "ts": int(row[0]),
-                "open": float(row[1]),
-                "high": float(row[2]),
-                "low": float(row[3]),
-                "close": float(row[4]),
-            }
-        )
-    return points
+    data = orjson.loads(_http.request("GET", url).data)
+    if isinstance(data, dict) and "code" in data:
+        raise ValueError(f"Binance API error: {data.get('msg')}")
+
+    # Klines rows carry 12 columns; unpack just the five we use.
+    return np.array(
+        [
+            (int(ts), float(o), float(h), float(l), float(c))
+            for ts, o, h, l, c, *_ in data
+        ],
+        dtype=OHLC_DTYPE,
+    )
 
 
-def clean_ohlc(points):
-    cleaned = []
-    last_ts = None
-    for p in points:
-        if p["open"] <= 0 or p["high"] <= 0 or p["low"] <= 0 or p["close"] <= 0:
-            continue
-        if not (p["low"] <= p["open"] <= p["high"] and p["low"] <= p["close"] <= p["high"]):
-            continue
-        if last_ts is not None and p["ts"] <= last_ts:
-            continue
-        last_ts = p["ts"]
-        cleaned.append(p)
-    return cleaned
-
-def percentile(sorted_vals, p: float):
-    if not sorted_vals:
-        return 0.0
-    idx = (len(sorted_vals) - 1) * p
-    low = math.floor(idx)
-    high = math.ceil(idx)
-    if low == high:
-        return sorted_vals[low]
-    w = idx - low
-    return sorted_vals[low] * (1 - w) + sorted_vals[high] * w
-
-
-def rolling_sma(values, window: int):
-    out = [None] * len(values)
-    if len(values) < window:
-        return out
-    for i in range(window - 1, len(values)):
-        out[i] = sum(values[i - window + 1 : i + 1]) / window
-    return out
-
-
-def rolling_std(values, window: int):
-    out = [None] * len(values)
-    if len(values) < window:
-        return out
-    for i in range(window - 1, len(values)):
-        out[i] = statistics.pstdev(values[i - window + 1 : i + 1])
-    return out
+def fetch_ohlc(days: int):
+    # Single-flight: when several handler threads miss the cache for the same
+    # lookback at once, one does the slow Binance round trip and the rest wait
+    # on its result instead of stacking duplicate 20 s requests.
+    while True:
+        with _ohlc_cache_lock:
+            cached = _ohlc_cache.get(days)
+            if cached is not None and time.time() - cached[0] < OHLC_CACHE_TTL:
+                return cached[1]
+            done = _ohlc_inflight.get(days)
+            if done is None:
+                done = threading.Event()
+                _ohlc_inflight[days] = done
+                break
+        # Another thread is fetching; wake when it finishes and re-check.
+        done.wait(timeout=25)
+
+    try:
+        candles = _fetch_ohlc_remote(days)
+        with _ohlc_cache_lock:
+            _ohlc_cache[days] = (time.time(), candles)
+        return candles
+    finally:
+        with _ohlc_cache_lock:
+            _ohlc_inflight.pop(days, None)
+        done.set()
+
+
+def clean_ohlc(candles):
+    if not len(candles):
+        return candles
+    o, h, l, c = candles["open"], candles["high"], candles["low"], candles["close"]
+    valid = (o > 0) & (h > 0) & (l > 0) & (c > 0)
+    valid &= (l <= o) & (o <= h) & (l <= c) & (c <= h)
+    candles = candles[valid]
+    if not len(candles):
+        return candles
+    # Keep strictly increasing timestamps: a bar survives only if its ts
+    # beats every earlier surviving ts, i.e. the running maximum so far.
+    ts = candles["ts"]
+    keep = np.empty(len(candles), dtype=bool)
+    keep[0] = True
+    keep[1:] = ts[1:] > np.maximum.accumulate(ts)[:-1]
+    return candles[keep]
+
+
+def candles_to_series(candles):
+    """Column-oriented series payload for the UI.
+
+    One array per field instead of a dict per bar cuts the repeated JSON
+    keys, and prices rounded to cents keep the float digits short — together
+    roughly halving the response size for a 365-day lookback.
+    """
+    return {
+        # orjson needs contiguous arrays; the field view is strided.
+        "ts": np.ascontiguousarray(candles["ts"]),
+        "open": np.round(candles["open"], 2),
+        "high": np.round(candles["high"], 2),
+        "low": np.round(candles["low"], 2),
+        "close": np.round(candles["close"], 2),
+    }
+
+@functools.lru_cache(maxsize=512)
+def _quantile_rank(n: int, p: float):
+    """Rank index and interpolation weight for the p-quantile of n values.
+
+    Lookback clamping allows only a few hundred distinct array lengths, so
+    the float rank arithmetic is memoized per (n, p) pair.
+    """
+    idx = (n - 1) * p
+    low = int(idx)
+    return low, idx - low
+
+
+def quantile_partition(values, p: float):
+    """Linear-interpolated quantile using np.partition instead of a full sort.
+
+    Only the two order statistics around the target rank are needed, so
+    partitioning finds them in O(n) where sorting would cost O(n log n).
+    Matches np.quantile's default "linear" method.
+    """
+    low, w = _quantile_rank(len(values), p)
+    if w == 0.0:
+        return np.partition(values, low)[low]
+    part = np.partition(values, (low, low + 1))
+    return part[low] * (1 - w) + part[low + 1] * w
 
 
 def compute_rsi(closes, period: int = 14):
     if len(closes) < period + 1:
         return None
-    gains = []
-    losses = []
-    for i in range(1, len(closes)):
-        change = closes[i] - closes[i - 1]
-        gains.append(max(change, 0.0))
-        losses.append(max(-change, 0.0))
-
-    avg_gain = sum(gains[:period]) / period
-    avg_loss = sum(losses[:period]) / period
-
-    for i in range(period, len(gains)):
-        avg_gain = ((avg_gain * (period - 1)) + gains[i]) / period
-        avg_loss = ((avg_loss * (period - 1)) + losses[i]) / period
+    changes = np.diff(np.asarray(closes, dtype=np.float64))
+    gains = np.maximum(changes, 0.0)
+    losses = np.maximum(-changes, 0.0)
+
+    avg_gain = gains[:period].mean()
+    avg_loss = losses[:period].mean()
+
+    # Wilder smoothing avg = ((period-1)*avg + x) / period is a first-order
+    # IIR filter, so lfilter can run the whole recursion in C; the seed
+    # averages enter through the initial filter state.
+    if len(gains) > period:
+        b = [1.0 / period]
+        a = [1.0, -(period - 1) / period]
+        decay = (period - 1) / period
+        avg_gain = lfilter(b, a, gains[period:], zi=[avg_gain * decay])[0][-1]
+        avg_loss = lfilter(b, a, losses[period:], zi=[avg_loss * decay])[0][-1]
 
     if avg_loss == 0:
         return 100.0
@@ -105,22 +178,20 @@ def compute_rsi(closes, period: int = 14):
     return 100 - (100 / (1 + rs))
 
 
-def compute_model(points, horizon_days: int):
-    closes = [p["close"] for p in points]
-    highs = [p["high"] for p in points]
-    lows = [p["low"] for p in points]
+def _model_stats(highs, lows, closes, horizon_days: int):
+    """Numeric core of compute_model.
 
+    Takes contiguous float64 arrays and returns only scalars, so all the
+    heavy arithmetic sits behind one array-in/scalar-out boundary.
+    """
     spot = closes[-1]
 
-    returns = []
-    for i in range(1, len(closes)):
-        returns.append(math.log(closes[i] / closes[i - 1]))
+    returns = np.log(closes[1:] / closes[:-1])
+    mean_return = returns.mean() if returns.size else 0.0
+    daily_vol = returns.std(ddof=1) if returns.size >= 2 else 0.0
 
-    mean_return = sum(returns) / max(1, len(returns))
-    daily_vol = statistics.stdev(returns) if len(returns) >= 2 else 0.0
-
-    drawdowns = sorted([(c - spot) / spot for c in closes])
-    severe_drawdown = abs(percentile(drawdowns, 0.12))
+    drawdowns = (closes - spot) / spot
+    severe_drawdown = abs(quantile_partition(drawdowns, 0.12))
 
     floor_by_drawdown = spot * (1 - severe_drawdown)
     floor_by_recent_low = min(lows[-min(30, len(lows)) :])
@@ -139,25 +210,71 @@ def compute_model(points, horizon_days: int):
     range95_low = spot * math.exp(drift - z95 * sigma)
     range95_high = spot * math.exp(drift + z95 * sigma)
 
-    true_ranges = []
-    for i in range(1, len(closes)):
-        tr = max(
-            highs[i] - lows[i],
-            abs(highs[i] - closes[i - 1]),
-            abs(lows[i] - closes[i - 1]),
-        )
-        true_ranges.append(tr)
-    atr14 = sum(true_ranges[-14:]) / min(14, len(true_ranges)) if true_ranges else 0.0
-
-    sma20 = rolling_sma(closes, 20)
-    std20 = rolling_std(closes, 20)
-    boll_mid = sma20[-1] if sma20 else None
-    boll_std = std20[-1] if std20 else None
-    boll_upper = boll_mid + 2 * boll_std if boll_mid is not None and boll_std is not None else None
-    boll_lower = boll_mid - 2 * boll_std if boll_mid is not None and boll_std is not None else None
+    prev_close = closes[:-1]
+    true_ranges = np.maximum.reduce(
+        [
+            highs[1:] - lows[1:],
+            np.abs(highs[1:] - prev_close),
+            np.abs(lows[1:] - prev_close),
+        ]
+    )
+    atr14 = true_ranges[-14:].mean() if true_ranges.size else 0.0
+
+    # Only the latest Bollinger values are reported, so a single mean/stdev
+    # over the 20-bar tail replaces the full rolling series.
+    if closes.size >= 20:
+        tail = closes[-20:]
+        boll_mid = tail.mean()
+        boll_std = tail.std()
+        boll_upper = boll_mid + 2 * boll_std
+        boll_lower = boll_mid - 2 * boll_std
+    else:
+        boll_mid = boll_upper = boll_lower = None
 
     rsi14 = compute_rsi(closes, 14)
 
+    return (
+        spot,
+        floor,
+        floor_by_drawdown,
+        severe_drawdown,
+        daily_vol,
+        range68_low,
+        range68_high,
+        range95_low,
+        range95_high,
+        atr14,
+        rsi14,
+        boll_mid,
+        boll_upper,
+        boll_lower,
+    )
+
+
+def compute_model(candles, horizon_days: int):
+    # Field views on the structured array are strided; compact them so the
+    # kernel gets the contiguous columns it expects.
+    closes = np.ascontiguousarray(candles["close"])
+    highs = np.ascontiguousarray(candles["high"])
+    lows = np.ascontiguousarray(candles["low"])
+
+    (
+        spot,
+        floor,
+        floor_by_drawdown,
+        severe_drawdown,
+        daily_vol,
+        range68_low,
+        range68_high,
+        range95_low,
+        range95_high,
+        atr14,
+        rsi14,
+        boll_mid,
+        boll_upper,
+        boll_lower,
+    ) = _model_stats(highs, lows, closes, horizon_days)
+
     return {
         "spot": spot,
         "floor": floor,
@@ -178,8 +295,45 @@ def compute_model(points, horizon_days: int):
     }
 
 
+# sqlite3 caches compiled statements per connection, keyed on the exact SQL
+# text — keeping these as shared constants means every execute after the
+# first reuses the prepared statement instead of re-parsing and re-planning.
+_INSERT_PREDICTION_SQL = """
+    INSERT INTO predictions (
+        created_at, lookback_days, horizon_days, spot, floor,
+        range68_low, range68_high, range95_low, range95_high, rsi14, atr14
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SELECT_HISTORY_SQL = """
+    SELECT id, created_at, lookback_days, horizon_days, spot, floor,
+           range68_low, range68_high, range95_low, range95_high, rsi14, atr14
+    FROM predictions
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+_tls = threading.local()
+
+
+def get_conn():
+    """Return this thread's cached SQLite connection, opening it on first use.
+
+    WAL journaling lets history reads proceed while a prediction insert is
+    committing, and reusing connections avoids an open/close per request.
+    """
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        _tls.conn = conn
+    return conn
+
+
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_conn()
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS predictions (
@@ -199,58 +353,81 @@ def init_db():
         """
     )
     conn.commit()
-    conn.close()
+
+
+_write_queue = queue.Queue(maxsize=1024)
+
+
+def _writer_loop():
+    """Drain queued prediction rows on a dedicated thread.
+
+    Commits are batched (every 50 rows or on a 100 ms idle gap) so analyze
+    responses never wait on an fsync.
+    """
+    conn = get_conn()
+    pending = 0
+    while True:
+        try:
+            row = _write_queue.get(timeout=0.1)
+        except queue.Empty:
+            if pending:
+                conn.commit()
+                pending = 0
+            continue
+        conn.execute(_INSERT_PREDICTION_SQL, row)
+        pending += 1
+        if pending >= 50:
+            conn.commit()
+            pending = 0
+
+
+def start_writer():
+    threading.Thread(target=_writer_loop, name="db-writer", daemon=True).start()
 
 
 def save_prediction(payload, lookback_days, horizon_days):
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute(
-        """
-        INSERT INTO predictions (
-            created_at, lookback_days, horizon_days, spot, floor,
-            range68_low, range68_high, range95_low, range95_high, rsi14, atr14
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            datetime.now(timezone.utc).isoformat(),
-            lookback_days,
-            horizon_days,
-            payload["spot"],
-            payload["floor"],
-            payload["range68"]["low"],
-            payload["range68"]["high"],
-            payload["range95"]["low"],
-            payload["range95"]["high"],
-            payload["indicators"]["rsi14"],
-            payload["indicators"]["atr14"],
-        ),
+    row = (
+        datetime.now(timezone.utc).isoformat(),
+        lookback_days,
+        horizon_days,
+        payload["spot"],
+        payload["floor"],
+        payload["range68"]["low"],
+        payload["range68"]["high"],
+        payload["range95"]["low"],
+        payload["range95"]["high"],
+        payload["indicators"]["rsi14"],
+        payload["indicators"]["atr14"],
     )
-    conn.commit()
-    conn.close()
+    try:
+        _write_queue.put_nowait(row)
+    except queue.Full:
+        # History is best-effort; dropping a row beats stalling the response.
+        pass
 
 
 def load_history(limit: int = 12):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
-        """
-        SELECT id, created_at, lookback_days, horizon_days, spot, floor,
-               range68_low, range68_high, range95_low, range95_high, rsi14, atr14
-        FROM predictions
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (limit,),
-    ).fetchall()
-    conn.close()
+    conn = get_conn()
+    rows = conn.execute(_SELECT_HISTORY_SQL, (limit,)).fetchall()
     return [dict(row) for row in rows]
 
 
 class AppHandler(SimpleHTTPRequestHandler):
+    def setup(self):
+        super().setup()
+        # Disable Nagle so the single header+body write goes out immediately
+        # instead of waiting on delayed ACKs.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
     def _send_json(self, payload, code=200):
-        body = json.dumps(payload).encode("utf-8")
+        body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
         self.send_response(code)
         self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            # Level 1 is near-memcpy speed and still shrinks the repetitive
+            # series JSON several-fold.
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
         self.send_header("Content-Length", str(len(body)))
         self.end_headers()
         self.wfile.write(body)
@@ -269,10 +446,10 @@ class AppHandler(SimpleHTTPRequestHandler):
             selected_days = lookback_days
 
             try:
-                points = clean_ohlc(fetch_ohlc(selected_days))
-                if len(points) < 25:
+                candles = clean_ohlc(fetch_ohlc(selected_days))
+                if len(candles) < 25:
                     raise ValueError("Not enough data from provider.")
-                model = compute_model(points, horizon_days)
+                model = compute_model(candles, horizon_days)
 
                 payload = {
                     "meta": {
@@ -281,7 +458,7 @@ class AppHandler(SimpleHTTPRequestHandler):
                         "horizon_days": horizon_days,
                         "updated_at": datetime.now(timezone.utc).isoformat(),
                     },
-                    "series": points,
+                    "series": candles_to_series(candles),
                     "model": model,
                 }
 
@@ -304,6 +481,7 @@ class AppHandler(SimpleHTTPRequestHandler):
 
 def main():
     init_db()
+    start_writer()
     server = ThreadingHTTPServer((HOST, PORT), AppHandler)
     print(f"Bitcoin app running at http://{HOST}:{PORT}")
     print("Press Ctrl+C to stop.")